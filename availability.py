@@ -0,0 +1,39 @@
+# availability.py
+
+from datetime import datetime, timedelta
+
+import database as db
+from config import WORK_HOURS
+from models import parse_time
+
+def _build_work_day_slots():
+    """Сетка стандартных слотов рабочего дня с шагом 15 минут."""
+    slots = set()
+    current_time = datetime.combine(datetime.min, parse_time(WORK_HOURS['start']))
+    end_time = datetime.combine(datetime.min, parse_time(WORK_HOURS['end']))
+    while current_time < end_time:
+        slots.add(current_time.time())
+        current_time += timedelta(minutes=15)
+    return frozenset(slots)
+
+# Рабочие часы не меняются во время работы бота - считаем сетку один раз
+WORK_DAY_SLOTS = _build_work_day_slots()
+
+def get_available_slots(date_str, service_id):
+    """Собирает свободное время на дату по всем мастерам, выполняющим услугу.
+
+    Возвращает словарь {time: [resource_id, ...]}, где список - свободные в это время мастера,
+    отсортированные по загрузке за день (менее загруженные первыми).
+    """
+    resource_ids = db.get_service_resources(service_id)
+    booked_by_resource = db.get_booked_slots(date_str, resource_ids)
+    resource_ids.sort(key=lambda resource_id: len(booked_by_resource[resource_id]))
+
+    candidate_slots = WORK_DAY_SLOTS.union(db.get_admin_slots(date_str))
+
+    available_slots = {}
+    for slot in candidate_slots:
+        free_resources = [r for r in resource_ids if slot not in booked_by_resource[r]]
+        if free_resources:
+            available_slots[slot] = free_resources
+    return available_slots
@@ -0,0 +1,66 @@
+# benchmarks/bench_booking_rows.py
+#
+# Сравнивает разбор строк записей через strptime (как было раньше) с BookingRow
+# и быстрым кодеком из models.py. Запуск из корня проекта:
+#     python benchmarks/bench_booking_rows.py
+
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from models import BookingRow, parse_datetime, parse_time  # noqa: E402
+
+ROWS_PER_UPDATE = 40
+REPEAT = 2000
+
+start = datetime(2025, 6, 16, 10, 0)
+rows = [
+    (i, 'Маникюр с покрытием', (start + timedelta(minutes=15 * i)).strftime('%Y-%m-%d %H:%M'))
+    for i in range(ROWS_PER_UPDATE)
+]
+
+
+def old_rows():
+    # Строки из базы + strptime в каждом месте использования (БД, клавиатура, хендлер)
+    booked = [datetime.strptime(r[2], '%Y-%m-%d %H:%M').time() for r in rows]
+    texts = []
+    for booking_id, service_name, booking_datetime in rows:
+        dt_obj = datetime.strptime(booking_datetime, '%Y-%m-%d %H:%M')
+        texts.append(f"{service_name} - {dt_obj.strftime('%d.%m.%Y %H:%M')}")
+    return booked, texts
+
+
+def new_rows():
+    # Время разбирается один раз при чтении из базы
+    bookings = [BookingRow(parse_datetime(r[2]), r[1], id=r[0]) for r in rows]
+    booked = [parse_time(r[2][11:]) for r in rows]
+    texts = [f"{b.service_name} - {b.start:%d.%m.%Y %H:%M}" for b in bookings]
+    return booked, texts
+
+
+def retained_memory(factory, count=1000):
+    """Память, занятая count объектами-записями (без общих строк и дат)."""
+    start_dt = parse_datetime(rows[0][2])
+    tracemalloc.start()
+    objects = [factory(start_dt) for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+if __name__ == '__main__':
+    assert old_rows() == new_rows()
+    for name, func in (('strptime', old_rows), ('BookingRow', new_rows)):
+        seconds = min(timeit.repeat(func, number=REPEAT, repeat=5))
+        print(f"{name:>12}: {seconds / REPEAT * 1e6:8.1f} мкс на обновление ({ROWS_PER_UPDATE} записей)")
+
+    as_dict = lambda dt: {'id': 1, 'start': dt, 'service_name': 'x', 'status': None,
+                          'client_name': None, 'client_phone': None, 'resource_name': None}
+    as_row = lambda dt: BookingRow(dt, 'x', id=1)
+    print(f"1000 записей: dict {retained_memory(as_dict) / 1024:.1f} КиБ, "
+          f"BookingRow {retained_memory(as_row) / 1024:.1f} КиБ")
@@ -0,0 +1,94 @@
+# benchmarks/bench_keyboards.py
+#
+# Сравнивает построение календаря и клавиатуры услуг "с нуля" (как было раньше)
+# с кэшированными версиями из keyboards.py и проверяет, что результат совпадает,
+# в том числе при смене дня. Запуск из корня проекта:
+#     python benchmarks/bench_keyboards.py
+
+import calendar
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from aiogram.types import InlineKeyboardButton  # noqa: E402
+from aiogram.utils.keyboard import InlineKeyboardBuilder  # noqa: E402
+
+import keyboards as kb  # noqa: E402
+
+SERVICES = {
+    'manicure': {'name': 'Маникюр с покрытием', 'price': 2500, 'duration': 90},
+    'pedicure': {'name': 'Педикюр', 'price': 3000, 'duration': 75},
+    'eyebrows': {'name': 'Коррекция бровей', 'price': 1000, 'duration': 30}
+}
+REPEAT = 2000
+
+
+def legacy_calendar_kb(year, month, prefix, today):
+    """Прежняя реализация create_calendar_kb (с датой "сегодня" в параметре)."""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text=" ", callback_data="ignore"),
+        InlineKeyboardButton(text=f"{kb.RUSSIAN_MONTHS[month - 1]} {year}", callback_data="ignore"),
+        InlineKeyboardButton(text=" ", callback_data="ignore")
+    )
+    days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+    builder.row(*[InlineKeyboardButton(text=day, callback_data="ignore") for day in days])
+    for week in calendar.monthcalendar(year, month):
+        row_buttons = []
+        for day in week:
+            if day == 0:
+                row_buttons.append(InlineKeyboardButton(text=" ", callback_data="ignore"))
+            else:
+                current_date = datetime(year, month, day).date()
+                if current_date < today:
+                    row_buttons.append(InlineKeyboardButton(text=str(day), callback_data="past_date"))
+                else:
+                    row_buttons.append(InlineKeyboardButton(text=str(day), callback_data=f"{prefix}:{current_date.strftime('%Y-%m-%d')}"))
+        builder.row(*row_buttons)
+    back_callback = "admin_panel" if prefix.startswith("admin") else "back_to_services"
+    nav_callback_prefix = prefix.replace('date', '')
+    builder.row(
+        InlineKeyboardButton(text="<", callback_data=f"{nav_callback_prefix}prev_month:{year}-{month}"),
+        InlineKeyboardButton(text="◀️ Назад", callback_data=back_callback),
+        InlineKeyboardButton(text=">", callback_data=f"{nav_callback_prefix}next_month:{year}-{month}")
+    )
+    return builder.as_markup()
+
+
+def legacy_services_kb(services, prefix="service"):
+    """Прежняя реализация get_services_kb."""
+    builder = InlineKeyboardBuilder()
+    for service_id, service_info in services.items():
+        builder.button(text=f"{service_info['name']} ({service_info['price']} руб.)", callback_data=f"{prefix}:{service_id}")
+    builder.button(text="◀️ Назад", callback_data="admin_panel" if prefix.startswith("admin") else "to_main_menu")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def check_equivalence():
+    # Каждый день двух лет как "сегодня", соседние месяцы и оба префикса - включая переходы через полночь
+    day = date(2025, 1, 1)
+    while day < date(2027, 1, 1):
+        for year, month in ((day.year, day.month), (day.year + (day.month == 12), day.month % 12 + 1)):
+            for prefix in ("date", "admin_date"):
+                assert kb.create_calendar_kb(year, month, prefix, today=day) == legacy_calendar_kb(year, month, prefix, day), (day, year, month)
+        day += timedelta(days=1)
+    for prefix in ("service", "admin_service"):
+        assert kb.get_services_kb(SERVICES, prefix) == legacy_services_kb(SERVICES, prefix)
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    today = date(2025, 6, 16)
+    cases = (
+        ('календарь, было', lambda: legacy_calendar_kb(2025, 6, "date", today)),
+        ('календарь, стало', lambda: kb.create_calendar_kb(2025, 6, "date", today=today)),
+        ('услуги, было', lambda: legacy_services_kb(SERVICES)),
+        ('услуги, стало', lambda: kb.get_services_kb(SERVICES)),
+    )
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=REPEAT, repeat=5))
+        print(f"{name:>18}: {seconds / REPEAT * 1e6:8.1f} мкс на клавиатуру")
@@ -31,6 +31,14 @@ SERVICES = {
     'eyebrows': {'name': 'Коррекция бровей', 'price': 1000, 'duration': 30}
 }
 
+# --- Настройки мастеров (ресурсов) ---
+# Ключ - внутренний идентификатор мастера, 'services' - список услуг, которые он выполняет.
+# Первый мастер в списке считается основным: на него переносятся старые записи при миграции.
+RESOURCES = {
+    'master_1': {'name': 'Мастер 1', 'services': ['manicure', 'pedicure', 'eyebrows']},
+    'master_2': {'name': 'Мастер 2', 'services': ['manicure', 'pedicure']}
+}
+
 # --- Настройки времени работы ---
 WORK_HOURS = {
     'start': '10:00',
@@ -1,25 +1,60 @@
 # database.py
 
+import re
 import sqlite3
-from datetime import datetime
 
-def init_db():
-    """Инициализирует базу данных и создает таблицы, если их нет."""
+from models import BookingRow, format_datetime, parse_datetime, parse_time
+
+def init_db(resources, services):
+    """Инициализирует базу данных и создает таблицы, если их нет.
+
+    resources - словарь мастеров из config.RESOURCES, синхронизируется с таблицами
+    resources и resource_services при каждом запуске.
+    services - словарь услуг из config.SERVICES, нужен для переноса цен в старые записи.
+    """
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
+    # WAL позволяет нескольким процессам-воркерам читать базу во время записи
+    cursor.execute("PRAGMA journal_mode = WAL")
+
+    # Клиенты: контактные данные хранятся один раз, записи ссылаются на них.
+    # user_id пустой у клиентов, записанных админом вручную.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS clients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER UNIQUE,
+        name TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        phone_digits TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_phone_digits ON clients (phone_digits)")
     
     # Таблица для хранения записей
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS bookings (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        user_name TEXT NOT NULL,
-        user_phone TEXT NOT NULL,
+        client_id INTEGER NOT NULL REFERENCES clients (id),
         service_name TEXT NOT NULL,
-        booking_datetime TEXT NOT NULL UNIQUE,
-        status TEXT NOT NULL DEFAULT 'confirmed' -- confirmed, cancelled
+        booking_datetime TEXT NOT NULL,
+        resource_id TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'confirmed', -- confirmed, cancelled
+        price INTEGER NOT NULL DEFAULT 0, -- цена и длительность услуги на момент записи
+        duration INTEGER NOT NULL DEFAULT 0
     )
     ''')
+    _migrate_legacy_bookings(cursor, next(iter(resources)), services)
+
+    # Один мастер не может иметь две активные записи на одно время.
+    # Индекс (resource_id, booking_datetime) также обслуживает выборку занятости по дню.
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_resource_datetime
+    ON bookings (resource_id, booking_datetime) WHERE status = 'confirmed'
+    ''')
+    # Для просмотра записей на день по всем мастерам сразу
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_datetime ON bookings (booking_datetime)")
+    # Для истории записей клиента
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_client ON bookings (client_id, booking_datetime)")
     
     # Таблица для хранения свободных слотов, управляемых админом
     cursor.execute('''
@@ -28,53 +63,327 @@ def init_db():
         slot_datetime TEXT NOT NULL UNIQUE
     )
     ''')
+
+    # Мастера и услуги, которые они выполняют
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resources (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resource_services (
+        resource_id TEXT NOT NULL,
+        service_id TEXT NOT NULL,
+        PRIMARY KEY (service_id, resource_id)
+    ) WITHOUT ROWID
+    ''')
+    _sync_resources(cursor, resources)
+
+    # Сводная статистика для админ-панели. Обновляется в add_booking и cancel_booking,
+    # поэтому отчеты читают готовые строки, а не агрегируют всю таблицу bookings.
+    # bookings - все созданные записи, cancellations - отмененные из них;
+    # booked_minutes и revenue - только по действующим (confirmed) записям.
+    stats_exist = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_daily'"
+    ).fetchone()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY, -- день визита, YYYY-MM-DD
+        bookings INTEGER NOT NULL DEFAULT 0,
+        cancellations INTEGER NOT NULL DEFAULT 0,
+        booked_minutes INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stats_service (
+        service_name TEXT PRIMARY KEY,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        cancellations INTEGER NOT NULL DEFAULT 0,
+        booked_minutes INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    if not stats_exist:
+        # Первый запуск со статистикой: один раз считаем по существующим записям
+        for table, key in (('stats_daily', "substr(booking_datetime, 1, 10)"), ('stats_service', 'service_name')):
+            cursor.execute(f'''
+            INSERT INTO {table}
+            SELECT {key}, COUNT(*), SUM(status = 'cancelled'),
+                   SUM(CASE WHEN status = 'confirmed' THEN duration ELSE 0 END),
+                   SUM(CASE WHEN status = 'confirmed' THEN price ELSE 0 END)
+            FROM bookings GROUP BY 1
+            ''')
+
+    # Лист ожидания: пользователи, ждущие свободного времени на день для услуги.
+    # Первичный ключ начинается с дня - выборка ожидающих по дате идет по нему.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS waitlist (
+        day TEXT NOT NULL, -- YYYY-MM-DD
+        service_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (day, service_id, user_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("DELETE FROM waitlist WHERE day < date('now', 'localtime')")
+
+    # Полнотекстовый индекс (триграммы) по имени и нормализованному телефону клиента.
+    # rowid совпадает с clients.id; обновляется в _save_client.
+    search_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clients_search'"
+    ).fetchone()
+    if not search_exists:
+        cursor.execute('''
+        CREATE VIRTUAL TABLE clients_search USING fts5(name, phone_digits, tokenize = 'trigram')
+        ''')
+        cursor.execute(
+            "INSERT INTO clients_search (rowid, name, phone_digits) SELECT id, name, phone_digits FROM clients"
+        )
     
     conn.commit()
     conn.close()
 
-def add_booking(user_id, user_name, user_phone, service_name, booking_datetime):
-    """Добавляет новую запись в базу данных."""
+def _migrate_legacy_bookings(cursor, default_resource_id, services):
+    """Переносит записи из исходной схемы (контакты в каждой записи, без мастеров и цен).
+
+    Таблица пересобирается один раз: контакты выносятся в clients с объединением повторов,
+    всем записям назначается мастер по умолчанию, цена и длительность берутся по названию услуги.
+    """
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(bookings)")]
+    if 'client_id' in columns:
+        return
+    cursor.execute("ALTER TABLE bookings RENAME TO bookings_old")
+    cursor.execute('''
+    CREATE TABLE bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER NOT NULL REFERENCES clients (id),
+        service_name TEXT NOT NULL,
+        booking_datetime TEXT NOT NULL,
+        resource_id TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'confirmed', -- confirmed, cancelled
+        price INTEGER NOT NULL DEFAULT 0, -- цена и длительность услуги на момент записи
+        duration INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    services_by_name = {service['name']: service for service in services.values()}
+    rows = cursor.execute('''
+    SELECT id, user_id, user_name, user_phone, service_name, booking_datetime, status
+    FROM bookings_old ORDER BY id
+    ''').fetchall()
+    for booking_id, user_id, user_name, user_phone, service_name, booking_datetime, status in rows:
+        # Записи, созданные админом, хранились с user_id = 0
+        client_id = _save_client(cursor, user_id or None, user_name, user_phone, index=False)
+        service = services_by_name.get(service_name, {})
+        cursor.execute('''
+        INSERT INTO bookings (id, client_id, service_name, booking_datetime, resource_id, status, price, duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (booking_id, client_id, service_name, booking_datetime, default_resource_id, status,
+              service.get('price', 0), service.get('duration', 0)))
+    cursor.execute("DROP TABLE bookings_old")
+
+def _sync_resources(cursor, resources):
+    """Приводит таблицы мастеров в соответствие с конфигурацией."""
+    cursor.execute("DELETE FROM resource_services")
+    for resource_id, resource_info in resources.items():
+        cursor.execute(
+            "INSERT INTO resources (id, name) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET name = excluded.name",
+            (resource_id, resource_info['name'])
+        )
+        cursor.executemany(
+            "INSERT INTO resource_services (resource_id, service_id) VALUES (?, ?)",
+            [(resource_id, service_id) for service_id in resource_info['services']]
+        )
+
+def normalize_phone(phone):
+    """Оставляет в телефоне только цифры, российскую 8 в начале заменяет на 7."""
+    digits = re.sub(r'\D', '', phone)
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    return digits
+
+def _day_bounds(date_str):
+    """Границы дня для диапазонного поиска по индексу вместо DATE(...) = ?."""
+    return f"{date_str} 00:00", f"{date_str} 23:59"
+
+def _save_client(cursor, user_id, name, phone, index=True):
+    """Находит или создает клиента для записи и возвращает его id.
+
+    Введенный телефон не подтвержден, поэтому по нему аккаунты не связываются:
+    пользователь Telegram (user_id) всегда получает свою строку и обновляет только ее.
+    Запись админа (user_id=None) переиспользует клиента без Telegram с тем же телефоном,
+    но не меняет его имя и телефон.
+    index=False - не трогать clients_search (при миграции он заполняется целиком).
+    """
+    phone_digits = normalize_phone(phone)
+    if user_id is not None:
+        row = cursor.execute("SELECT id FROM clients WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            client_id = row[0]
+            cursor.execute(
+                "UPDATE clients SET name = ?, phone = ?, phone_digits = ? WHERE id = ?",
+                (name, phone, phone_digits, client_id)
+            )
+            if index:
+                cursor.execute("DELETE FROM clients_search WHERE rowid = ?", (client_id,))
+                cursor.execute(
+                    "INSERT INTO clients_search (rowid, name, phone_digits) VALUES (?, ?, ?)",
+                    (client_id, name, phone_digits)
+                )
+            return client_id
+    else:
+        row = cursor.execute(
+            "SELECT id FROM clients WHERE phone_digits = ? AND user_id IS NULL ORDER BY id LIMIT 1",
+            (phone_digits,)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+
+    cursor.execute(
+        "INSERT INTO clients (user_id, name, phone, phone_digits) VALUES (?, ?, ?, ?)",
+        (user_id, name, phone, phone_digits)
+    )
+    client_id = cursor.lastrowid
+    if index:
+        cursor.execute(
+            "INSERT INTO clients_search (rowid, name, phone_digits) VALUES (?, ?, ?)",
+            (client_id, name, phone_digits)
+        )
+    return client_id
+
+def get_client_contact(user_id):
+    """Возвращает сохраненные (имя, телефон) пользователя Telegram или None."""
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
-    cursor.execute('''
-    INSERT INTO bookings (user_id, user_name, user_phone, service_name, booking_datetime, status)
-    VALUES (?, ?, ?, ?, ?, 'confirmed')
-    ''', (user_id, user_name, user_phone, service_name, booking_datetime.strftime('%Y-%m-%d %H:%M')))
-    conn.commit()
+    cursor.execute("SELECT name, phone FROM clients WHERE user_id = ?", (user_id,))
+    contact = cursor.fetchone()
     conn.close()
+    return contact
+
+def _update_stats(cursor, day, service_name, bookings=0, cancellations=0, booked_minutes=0, revenue=0):
+    """Прибавляет значения к сводной статистике дня и услуги."""
+    for table, key in (('stats_daily', day), ('stats_service', service_name)):
+        cursor.execute(f'''
+        INSERT INTO {table} VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            cancellations = cancellations + excluded.cancellations,
+            booked_minutes = booked_minutes + excluded.booked_minutes,
+            revenue = revenue + excluded.revenue
+        ''', (key, bookings, cancellations, booked_minutes, revenue))
+
+def add_booking(user_id, user_name, user_phone, service, booking_datetime, resource_id):
+    """Добавляет новую запись в базу данных.
+
+    user_id - ID пользователя Telegram или None для записи, созданной админом.
+    service - описание услуги из config.SERVICES (name, price, duration).
+    """
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    try:
+        client_id = _save_client(cursor, user_id, user_name, user_phone)
+        # Уникальность времени задана по мастеру, поэтому двойную запись клиента проверяем отдельно
+        cursor.execute(
+            "SELECT 1 FROM bookings WHERE client_id = ? AND booking_datetime = ? AND status = 'confirmed'",
+            (client_id, format_datetime(booking_datetime))
+        )
+        if cursor.fetchone():
+            raise sqlite3.IntegrityError("Клиент уже записан на это время")
+        cursor.execute('''
+        INSERT INTO bookings (client_id, service_name, booking_datetime, resource_id, status, price, duration)
+        VALUES (?, ?, ?, ?, 'confirmed', ?, ?)
+        ''', (client_id, service['name'], format_datetime(booking_datetime), resource_id, service['price'], service['duration']))
+        _update_stats(
+            cursor, booking_datetime.date().isoformat(), service['name'],
+            bookings=1, booked_minutes=service['duration'], revenue=service['price']
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 def get_user_bookings(user_id):
     """Получает все активные записи пользователя."""
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
     cursor.execute('''
-    SELECT id, service_name, booking_datetime FROM bookings
-    WHERE user_id = ? AND status = 'confirmed' AND DATETIME(booking_datetime) > DATETIME('now', 'localtime')
-    ORDER BY booking_datetime
+    SELECT b.id, b.service_name, b.booking_datetime FROM clients c
+    JOIN bookings b ON b.client_id = c.id
+    WHERE c.user_id = ? AND b.status = 'confirmed' AND b.booking_datetime > strftime('%Y-%m-%d %H:%M', 'now', 'localtime')
+    ORDER BY b.booking_datetime
     ''', (user_id,))
-    bookings = cursor.fetchall()
+    bookings = [
+        BookingRow(parse_datetime(booking_datetime), service_name, id=booking_id)
+        for booking_id, service_name, booking_datetime in cursor.fetchall()
+    ]
     conn.close()
     return bookings
 
 def cancel_booking(booking_id):
-    """Отменяет запись по ее ID."""
+    """Отменяет запись по ее ID.
+
+    Возвращает (date_str, resource_id) освободившегося времени или None, если запись уже была отменена.
+    """
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
-    cursor.execute("UPDATE bookings SET status = 'cancelled' WHERE id = ?", (booking_id,))
+    cursor.execute('''
+    UPDATE bookings SET status = 'cancelled' WHERE id = ? AND status = 'confirmed'
+    RETURNING substr(booking_datetime, 1, 10), service_name, duration, price, resource_id
+    ''', (booking_id,))
+    row = cursor.fetchone()
+    freed = None
+    if row is not None:
+        # Повторная отмена уже отмененной записи статистику не меняет
+        day, service_name, duration, price, resource_id = row
+        _update_stats(cursor, day, service_name, cancellations=1, booked_minutes=-duration, revenue=-price)
+        freed = (day, resource_id)
     conn.commit()
     conn.close()
+    return freed
 
-def get_booked_slots(date_str):
-    """Получает все забронированные слоты на определенную дату."""
+def get_service_resources(service_id):
+    """Получает список мастеров, выполняющих услугу."""
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
-    cursor.execute('''
-    SELECT booking_datetime FROM bookings
-    WHERE DATE(booking_datetime) = ? AND status = 'confirmed'
-    ''', (date_str,))
-    booked_times = [datetime.strptime(row[0], '%Y-%m-%d %H:%M').time() for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT resource_id FROM resource_services WHERE service_id = ? ORDER BY resource_id",
+        (service_id,)
+    )
+    resource_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return resource_ids
+
+def get_resource_services(resource_id):
+    """Получает список услуг, которые выполняет мастер."""
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute("SELECT service_id FROM resource_services WHERE resource_id = ?", (resource_id,))
+    service_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return service_ids
+
+def get_booked_slots(date_str, resource_ids):
+    """Получает занятое время на дату отдельно для каждого мастера.
+
+    Возвращает словарь {resource_id: set(time)}; запрос идет по индексу (resource_id, booking_datetime).
+    """
+    booked = {resource_id: set() for resource_id in resource_ids}
+    if not resource_ids:
+        return booked
+    day_start, day_end = _day_bounds(date_str)
+    placeholders = ", ".join("?" * len(resource_ids))
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    SELECT resource_id, booking_datetime FROM bookings
+    WHERE resource_id IN ({placeholders}) AND booking_datetime BETWEEN ? AND ? AND status = 'confirmed'
+    ''', (*resource_ids, day_start, day_end))
+    for resource_id, booking_datetime in cursor.fetchall():
+        booked[resource_id].add(parse_time(booking_datetime[11:]))
     conn.close()
-    return booked_times
+    return booked
 
 def get_admin_slots(date_str):
     """Получает все созданные админом слоты на дату."""
@@ -82,9 +391,9 @@ def get_admin_slots(date_str):
     cursor = conn.cursor()
     cursor.execute('''
     SELECT slot_datetime FROM time_slots
-    WHERE DATE(slot_datetime) = ?
-    ''', (date_str,))
-    admin_slots = [datetime.strptime(row[0], '%Y-%m-%d %H:%M').time() for row in cursor.fetchall()]
+    WHERE slot_datetime BETWEEN ? AND ?
+    ''', _day_bounds(date_str))
+    admin_slots = [parse_time(row[0][11:]) for row in cursor.fetchall()]
     conn.close()
     return admin_slots
 
@@ -93,7 +402,7 @@ def add_admin_slot(slot_datetime):
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO time_slots (slot_datetime) VALUES (?)", (slot_datetime.strftime('%Y-%m-%d %H:%M'),))
+        cursor.execute("INSERT INTO time_slots (slot_datetime) VALUES (?)", (format_datetime(slot_datetime),))
         conn.commit()
     except sqlite3.IntegrityError:
         # Слот уже существует
@@ -105,7 +414,7 @@ def remove_admin_slot(slot_datetime):
     """Удаляет слот времени, созданный админом."""
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM time_slots WHERE slot_datetime = ?", (slot_datetime.strftime('%Y-%m-%d %H:%M'),))
+    cursor.execute("DELETE FROM time_slots WHERE slot_datetime = ?", (format_datetime(slot_datetime),))
     conn.commit()
     conn.close()
     
@@ -114,10 +423,114 @@ def get_daily_bookings(date_str):
     conn = sqlite3.connect('bookings.db')
     cursor = conn.cursor()
     cursor.execute('''
-    SELECT booking_datetime, user_name, user_phone, service_name FROM bookings
-    WHERE DATE(booking_datetime) = ? AND status = 'confirmed'
-    ORDER BY booking_datetime
-    ''', (date_str,))
-    bookings = cursor.fetchall()
+    SELECT b.booking_datetime, c.name, c.phone, b.service_name, r.name FROM bookings b
+    JOIN clients c ON c.id = b.client_id
+    LEFT JOIN resources r ON r.id = b.resource_id
+    WHERE b.booking_datetime BETWEEN ? AND ? AND b.status = 'confirmed'
+    ORDER BY b.booking_datetime, r.name
+    ''', _day_bounds(date_str))
+    bookings = [
+        BookingRow(parse_datetime(booking_datetime), service_name, client_name=name, client_phone=phone, resource_name=resource_name)
+        for booking_datetime, name, phone, service_name, resource_name in cursor.fetchall()
+    ]
+    conn.close()
+    return bookings
+
+def search_client_bookings(query, limit=20):
+    """Ищет записи клиента по фрагменту имени или телефона (не короче 3 символов).
+
+    Запрос из цифр ищется по нормализованному телефону как подстрока (ведущая 8 меняется на 7
+    только у полного номера, иначе не нашлись бы цифры из середины), иначе - по имени клиента.
+    Возвращает историю записей, включая отмененные, новые первыми.
+    """
+    digits = normalize_phone(query)
+    if len(digits) >= 3 and not re.search(r'[^\d\s()+-]', query):
+        column, term = 'phone_digits', digits
+    else:
+        column, term = 'name', query.strip()
+    if len(term) < 3:
+        return []
+    escaped_term = term.replace('"', '""')
+    match_expr = f'{column} : "{escaped_term}"'
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT b.booking_datetime, c.name, c.phone, b.service_name, b.status FROM clients_search s
+    JOIN clients c ON c.id = s.rowid
+    JOIN bookings b ON b.client_id = c.id
+    WHERE clients_search MATCH ?
+    ORDER BY b.booking_datetime DESC
+    LIMIT ?
+    ''', (match_expr, limit))
+    bookings = [
+        BookingRow(parse_datetime(booking_datetime), service_name, status=status, client_name=name, client_phone=phone)
+        for booking_datetime, name, phone, service_name, status in cursor.fetchall()
+    ]
+    conn.close()
+    return bookings
+
+def get_daily_stats(start_date_str, end_date_str):
+    """Сводная статистика по дням в диапазоне дат (включительно).
+
+    Возвращает {date_str: (bookings, cancellations, booked_minutes, revenue)}; дни без записей отсутствуют.
+    """
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT day, bookings, cancellations, booked_minutes, revenue FROM stats_daily
+    WHERE day BETWEEN ? AND ?
+    ''', (start_date_str, end_date_str))
+    stats = {row[0]: row[1:] for row in cursor.fetchall()}
+    conn.close()
+    return stats
+
+def get_service_stats():
+    """Сводная статистика по услугам за все время: (service_name, bookings, cancellations, revenue)."""
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT service_name, bookings, cancellations, revenue FROM stats_service
+    ORDER BY revenue DESC
+    ''')
+    stats = cursor.fetchall()
+    conn.close()
+    return stats
+
+def add_waiter(user_id, date_str, service_id):
+    """Добавляет пользователя в лист ожидания на дату для услуги."""
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR IGNORE INTO waitlist (day, service_id, user_id) VALUES (?, ?, ?)",
+        (date_str, service_id, user_id)
+    )
+    conn.commit()
+    conn.close()
+
+def get_waitlist_services(date_str):
+    """Получает услуги, для которых на дату есть ожидающие."""
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT service_id FROM waitlist WHERE day = ?", (date_str,))
+    service_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return service_ids
+
+def pop_waiters(date_str, service_id):
+    """Удаляет из листа ожидания и возвращает пользователей, ждущих услугу на дату."""
+    conn = sqlite3.connect('bookings.db')
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM waitlist WHERE day = ? AND service_id = ? RETURNING user_id",
+        (date_str, service_id)
+    )
+    user_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    conn.close()
+    return user_ids
+
+def checkpoint():
+    """Переносит журнал WAL в основной файл базы. Вызывается при остановке процесса."""
+    conn = sqlite3.connect('bookings.db')
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     conn.close()
-    return bookings
\ No newline at end of file
@@ -1,16 +1,21 @@
+import html
 import logging
 import re
-from datetime import datetime, timedelta
+import sqlite3
+from datetime import date, datetime, timedelta
 
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State, any_state
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.types import Message, CallbackQuery
 
 import database as db
 import keyboards as kb
-from config import ADMIN_IDS, SERVICES, WORK_HOURS
+import notifications
+from availability import WORK_DAY_SLOTS, get_available_slots
+from models import parse_date, parse_datetime, parse_time
+from config import ADMIN_IDS, RESOURCES, SERVICES
 
 router = Router()
 
@@ -22,6 +27,37 @@ def format_date_russian(dt_obj):
     ]
     return f"{dt_obj.day} {months[dt_obj.month - 1]} {dt_obj.year} г."
 
+def format_booking_summary(user_data):
+    """Формирует текст для подтверждения записи из данных FSM."""
+    service_name = SERVICES[user_data['service_id']]['name']
+    booking_dt_obj = parse_datetime(f"{user_data['chosen_date']} {user_data['chosen_time']}")
+    return (
+        f"✅ <b>Проверьте и подтвердите запись:</b>\n\n"
+        f"<b>Услуга:</b> {service_name}\n"
+        f"<b>Дата и время:</b> {format_date_russian(booking_dt_obj)}, {booking_dt_obj.strftime('%H:%M')}\n"
+        f"<b>Имя:</b> {user_data['user_name']}\n"
+        f"<b>Телефон:</b> {user_data['user_phone']}"
+    )
+
+def book_with_free_resource(user_id, user_data, booking_datetime):
+    """Создает запись у мастера, выбранного вместе со временем, а если его время уже заняли -
+    у другого мастера, свободного в это время. Возвращает id мастера.
+
+    Если записать не удалось ни к кому, пробрасывает последнюю sqlite3.IntegrityError.
+    """
+    free_resources = get_available_slots(user_data['chosen_date'], user_data['service_id']).get(booking_datetime.time(), [])
+    candidates = [user_data['resource_id']] + [r for r in free_resources if r != user_data['resource_id']]
+    for resource_id in candidates:
+        try:
+            db.add_booking(
+                user_id, user_data['user_name'], user_data['user_phone'],
+                SERVICES[user_data['service_id']], booking_datetime, resource_id
+            )
+            return resource_id
+        except sqlite3.IntegrityError as e:
+            error = e
+    raise error
+
 # ================================================
 #          МАШИНА СОСТОЯНИЙ (FSM)
 # ================================================
@@ -43,6 +79,7 @@ class Admin(StatesGroup):
     manual_booking_time = State()
     manual_booking_name = State()
     manual_booking_phone = State()
+    searching_client = State()
 
 # ================================================
 #          ОБЩИЕ ХЕНДЛЕРЫ
@@ -188,49 +225,58 @@ async def process_date_choice(callback: CallbackQuery, state: FSMContext):
     user_data = await state.get_data()
     service_id = user_data['service_id']
     
-    booked_slots = db.get_booked_slots(date_str)
-    admin_slots = db.get_admin_slots(date_str)
-    
-    available_slots = []
-    start_time = datetime.strptime(WORK_HOURS['start'], '%H:%M')
-    end_time = datetime.strptime(WORK_HOURS['end'], '%H:%M')
-    
-    current_time = start_time
-    while current_time < end_time:
-        slot_time_obj = current_time.time()
-        is_booked = any(
-            slot_time_obj == booked_slot for booked_slot in booked_slots
-        )
-        if not is_booked:
-            available_slots.append(slot_time_obj)
-        current_time += timedelta(minutes=15)
-        
-    for admin_slot in admin_slots:
-        if admin_slot not in [s for s in available_slots] and admin_slot not in booked_slots:
-            available_slots.append(admin_slot)
-    
-    available_slots.sort()
+    available_slots = sorted(get_available_slots(date_str, service_id))
 
     next_state = Admin.manual_booking_time if is_admin else Booking.choosing_time
     await state.set_state(next_state)
 
-    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    date_obj = parse_date(date_str)
     await callback.message.edit_text(
         f"Доступное время на <b>{format_date_russian(date_obj)}</b>:",
         reply_markup=kb.get_time_slots_kb(
             available_slots, 
             back_callback="admin_date" if is_admin else "back_to_calendar",
-            prefix=f"{prefix}time"
+            prefix=f"{prefix}time",
+            waitlist_callback=None if is_admin else f"waitlist:{date_str}"
         )
     )
     await callback.answer()
 
+@router.callback_query(StateFilter(Booking.choosing_time), F.data.startswith("waitlist:"))
+async def process_waitlist_subscribe(callback: CallbackQuery, state: FSMContext):
+    date_str = callback.data.partition(":")[2]
+    user_data = await state.get_data()
+    db.add_waiter(callback.from_user.id, date_str, user_data['service_id'])
+    await callback.answer(
+        f"Мы пришлем сообщение, как только на {format_date_russian(parse_date(date_str))} освободится время.",
+        show_alert=True
+    )
+
 @router.callback_query(StateFilter(Booking.choosing_time, Admin.manual_booking_time), F.data.startswith(("time:", "admin_time:")))
 async def process_time_choice(callback: CallbackQuery, state: FSMContext):
     time_str = callback.data.partition(":")[2]
-    await state.update_data(chosen_time=time_str)
+    user_data = await state.get_data()
+    available_slots = get_available_slots(user_data['chosen_date'], user_data['service_id'])
+    free_resources = available_slots.get(parse_time(time_str))
+    if not free_resources:
+        await callback.answer("Это время уже заняли. Пожалуйста, выберите другое.", show_alert=True)
+        return
+    await state.update_data(chosen_time=time_str, resource_id=free_resources[0])
     
     is_admin = callback.data.startswith("admin_")
+    contact = None if is_admin else db.get_client_contact(callback.from_user.id)
+    if contact:
+        # Клиент уже записывался: имя и телефон известны, сразу переходим к подтверждению
+        user_name, user_phone = contact
+        await state.update_data(user_name=user_name, user_phone=user_phone)
+        await state.set_state(Booking.entering_phone)
+        await callback.message.edit_text(
+            format_booking_summary(await state.get_data()),
+            reply_markup=kb.get_confirmation_kb(can_edit_contact=True)
+        )
+        await callback.answer()
+        return
+
     next_state = Admin.manual_booking_name if is_admin else Booking.entering_name
     await state.set_state(next_state)
     
@@ -270,22 +316,21 @@ async def process_phone_input(message: Message, state: FSMContext):
     await state.update_data(user_phone=message.text)
     user_data = await state.get_data()
     
-    service_name = SERVICES[user_data['service_id']]['name']
-    booking_dt_obj = datetime.strptime(f"{user_data['chosen_date']} {user_data['chosen_time']}", '%Y-%m-%d %H:%M')
-    
     current_state = await state.get_state()
     is_admin = current_state == Admin.manual_booking_phone
     prefix = "admin_" if is_admin else ""
 
     await message.answer(
-        f"✅ <b>Проверьте и подтвердите запись:</b>\n\n"
-        f"<b>Услуга:</b> {service_name}\n"
-        f"<b>Дата и время:</b> {format_date_russian(booking_dt_obj)}, {booking_dt_obj.strftime('%H:%M')}\n"
-        f"<b>Имя:</b> {user_data['user_name']}\n"
-        f"<b>Телефон:</b> {message.text}",
+        format_booking_summary(user_data),
         reply_markup=kb.get_confirmation_kb(prefix=prefix)
     )
 
+@router.callback_query(StateFilter(Booking.entering_phone), F.data == "edit_contact")
+async def process_edit_contact(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(Booking.entering_name)
+    await callback.message.edit_text("Введите ваше имя:", reply_markup=kb.cancel_kb)
+    await callback.answer()
+
 @router.callback_query(F.data.endswith("confirm_booking"))
 async def process_confirm_booking(callback: CallbackQuery, state: FSMContext):
     current_state = await state.get_state()
@@ -297,12 +342,12 @@ async def process_confirm_booking(callback: CallbackQuery, state: FSMContext):
     is_admin = callback.data.startswith("admin_")
     
     service_name = SERVICES[user_data['service_id']]['name']
-    booking_datetime = datetime.strptime(f"{user_data['chosen_date']} {user_data['chosen_time']}", '%Y-%m-%d %H:%M')
+    booking_datetime = parse_datetime(f"{user_data['chosen_date']} {user_data['chosen_time']}")
     user_name, user_phone = user_data['user_name'], user_data['user_phone']
-    user_id = callback.from_user.id if not is_admin else 0 
+    user_id = callback.from_user.id if not is_admin else None
     
     try:
-        db.add_booking(user_id, user_name, user_phone, service_name, booking_datetime)
+        book_with_free_resource(user_id, user_data, booking_datetime)
         
         if is_admin:
             final_text = (
@@ -334,7 +379,8 @@ async def process_confirm_booking(callback: CallbackQuery, state: FSMContext):
     except Exception as e:
         logging.error(f"Ошибка при записи в БД: {e}")
         await callback.message.edit_text(
-            "❌ Произошла ошибка при создании записи. Возможно, это время уже заняли.", reply_markup=None
+            "❌ Произошла ошибка при создании записи. Возможно, это время уже заняли "
+            "или у клиента уже есть запись на это время.", reply_markup=None
         )
         await state.clear()
     
@@ -343,7 +389,9 @@ async def process_confirm_booking(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("cancel_booking:"))
 async def process_cancel_booking(callback: CallbackQuery):
     booking_id = int(callback.data.split(":")[1])
-    db.cancel_booking(booking_id)
+    freed = db.cancel_booking(booking_id)
+    if freed:
+        notifications.notify_slot_freed(*freed)
     await callback.message.edit_text("Ваша запись успешно отменена.", reply_markup=None)
     await callback.answer("Запись отменена")
     
@@ -375,15 +423,16 @@ async def admin_show_daily_bookings(callback: CallbackQuery, state: FSMContext):
     date_str = callback.data.partition(":")[2]
     bookings = db.get_daily_bookings(date_str)
     
-    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    date_obj = parse_date(date_str)
     if not bookings:
         response_text = f"На {format_date_russian(date_obj)} записей нет."
     else:
         response_text = f"📋 <b>Записи на {format_date_russian(date_obj)}:</b>\n\n"
         for booking in bookings:
-            booking_time, name, phone, service = booking
-            dt_obj = datetime.strptime(booking_time, '%Y-%m-%d %H:%M')
-            response_text += f"▪️ <b>{dt_obj.strftime('%H:%M')}</b> - {name}, {phone} (<i>{service}</i>)\n"
+            response_text += (
+                f"▪️ <b>{booking.start:%H:%M}</b> - {booking.client_name}, {booking.client_phone} "
+                f"(<i>{booking.service_name}</i>, {booking.resource_name})\n"
+            )
             
     await callback.message.edit_text(response_text, reply_markup=kb.admin_back_kb)
     await state.set_state(Admin.panel)
@@ -411,8 +460,9 @@ async def admin_add_slot_time(message: Message, state: FSMContext):
         time_obj = datetime.strptime(message.text, '%H:%M').time()
         user_data = await state.get_data()
         date_str = user_data['admin_chosen_date']
-        slot_datetime = datetime.combine(datetime.strptime(date_str, '%Y-%m-%d'), time_obj)
+        slot_datetime = datetime.combine(parse_date(date_str), time_obj)
         db.add_admin_slot(slot_datetime)
+        notifications.notify_slot_freed(date_str)
         await message.answer(f"✅ Слот <b>{slot_datetime.strftime('%d.%m.%Y %H:%M')}</b> успешно добавлен!", reply_markup=kb.admin_back_kb)
         await state.set_state(Admin.panel)
     except ValueError:
@@ -428,15 +478,16 @@ async def admin_remove_slot_date(callback: CallbackQuery, state: FSMContext):
     date_str = callback.data.partition(":")[2]
     slots_for_removal = db.get_admin_slots(date_str)
     await callback.message.edit_text(
-        f"Выберите слот для удаления на {format_date_russian(datetime.strptime(date_str, '%Y-%m-%d'))}:",
+        f"Выберите слот для удаления на {format_date_russian(parse_date(date_str))}:",
         reply_markup=kb.get_slots_for_removal_kb(slots_for_removal, date_str)
     )
     await state.set_state(Admin.panel)
 
 @router.callback_query(Admin.panel, F.data.startswith("admin_delete_slot:"))
 async def admin_delete_slot_confirm(callback: CallbackQuery, state: FSMContext):
-    _, date_str, time_str = callback.data.split(":")
-    slot_datetime = datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M')
+    # Формат: admin_delete_slot:YYYY-MM-DD_HH:MM
+    date_str, _, time_str = callback.data.partition(":")[2].partition("_")
+    slot_datetime = parse_datetime(f"{date_str} {time_str}")
     db.remove_admin_slot(slot_datetime)
     await callback.message.edit_text(
         f"🗑 Слот <b>{slot_datetime.strftime('%d.%m.%Y %H:%M')}</b> успешно удален.",
@@ -447,4 +498,92 @@ async def admin_delete_slot_confirm(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(Admin.panel, F.data == "admin_manual_booking_start")
 async def admin_manual_booking_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(Admin.manual_booking_service)
-    await callback.message.edit_text("Шаг 1: Выберите услугу для клиента", reply_markup=kb.get_services_kb(SERVICES, prefix="admin_service"))
\ No newline at end of file
+    await callback.message.edit_text("Шаг 1: Выберите услугу для клиента", reply_markup=kb.get_services_kb(SERVICES, prefix="admin_service"))
+
+def format_client_search_results(query, bookings):
+    """Формирует текст с историей записей, найденных поиском клиента."""
+    # Запрос и имена введены пользователями, а сообщение уходит с parse_mode="HTML"
+    query = html.escape(query)
+    if not bookings:
+        return f"По запросу «{query}» ничего не найдено."
+    status_marks = {'confirmed': '✅', 'cancelled': '❌'}
+    response_text = f"🔎 <b>Записи по запросу «{query}»:</b>\n\n"
+    for booking in bookings:
+        response_text += (
+            f"{status_marks.get(booking.status, '▪️')} <b>{booking.start:%d.%m.%Y %H:%M}</b> - "
+            f"{html.escape(booking.client_name)}, {html.escape(booking.client_phone)} "
+            f"(<i>{booking.service_name}</i>)\n"
+        )
+    return response_text
+
+@router.callback_query(Admin.panel, F.data == "admin_search_client")
+async def admin_search_client_start(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(Admin.searching_client)
+    await callback.message.edit_text(
+        "Введите имя клиента или часть номера телефона (не меньше 3 символов):",
+        reply_markup=kb.admin_back_kb
+    )
+    await callback.answer()
+
+@router.message(Admin.searching_client)
+async def admin_search_client(message: Message, state: FSMContext):
+    query = message.text.strip()
+    bookings = db.search_client_bookings(query)
+    await message.answer(format_client_search_results(query, bookings), reply_markup=kb.admin_back_kb)
+    await state.set_state(Admin.panel)
+
+@router.message(Command("find"))
+async def cmd_find(message: Message, command: CommandObject):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("У вас нет прав доступа.")
+        return
+    if not command.args:
+        await message.answer("Использование: /find имя или часть телефона")
+        return
+    query = command.args.strip()
+    bookings = db.search_client_bookings(query)
+    await message.answer(format_client_search_results(query, bookings))
+
+def format_stats_report(today):
+    """Формирует отчет по загрузке, выручке и отменам из сводных таблиц."""
+    weekdays = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+    # Емкость дня: все стандартные слоты рабочего дня у всех мастеров
+    day_capacity = len(WORK_DAY_SLOTS) * 15 * len(RESOURCES)
+
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    month_end = next_month - timedelta(days=1)
+    daily_stats = db.get_daily_stats(min(week_start, month_start).isoformat(), max(week_start + timedelta(days=6), month_end).isoformat())
+
+    def occupancy(days):
+        booked_minutes = sum(daily_stats.get(day.isoformat(), (0, 0, 0, 0))[2] for day in days)
+        return round(100 * booked_minutes / (day_capacity * len(days))) if day_capacity else 0
+
+    response_text = "📊 <b>Статистика</b>\n\n<b>Загрузка на этой неделе:</b>\n"
+    week_days = [week_start + timedelta(days=i) for i in range(7)]
+    for day in week_days:
+        day_bookings, day_cancellations, _, _ = daily_stats.get(day.isoformat(), (0, 0, 0, 0))
+        response_text += f"{weekdays[day.weekday()]} {day:%d.%m}: {occupancy([day])}% (записей: {day_bookings - day_cancellations})\n"
+    response_text += f"За неделю: <b>{occupancy(week_days)}%</b>\n\n"
+
+    month_days = [month_start + timedelta(days=i) for i in range(month_end.day)]
+    month_revenue = sum(daily_stats.get(day.isoformat(), (0, 0, 0, 0))[3] for day in month_days)
+    response_text += (
+        f"<b>{kb.RUSSIAN_MONTHS[today.month - 1]} {today.year}:</b> загрузка {occupancy(month_days)}%, "
+        f"выручка {month_revenue} руб.\n\n<b>Выручка по услугам (за все время):</b>\n"
+    )
+
+    total_bookings = total_cancellations = 0
+    for service_name, service_bookings, service_cancellations, revenue in db.get_service_stats():
+        total_bookings += service_bookings
+        total_cancellations += service_cancellations
+        response_text += f"▪️ {service_name}: {revenue} руб. (записей: {service_bookings - service_cancellations})\n"
+    cancel_rate = round(100 * total_cancellations / total_bookings) if total_bookings else 0
+    response_text += f"\n<b>Доля отмен:</b> {cancel_rate}% ({total_cancellations} из {total_bookings})"
+    return response_text
+
+@router.callback_query(Admin.panel, F.data == "admin_stats")
+async def admin_stats(callback: CallbackQuery):
+    await callback.message.edit_text(format_stats_report(date.today()), reply_markup=kb.admin_back_kb)
+    await callback.answer()
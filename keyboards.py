@@ -3,6 +3,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from datetime import datetime, timedelta
+from functools import lru_cache
 import calendar
 
 # Список для заголовков календаря (Именительный падеж)
@@ -33,7 +34,20 @@ cancel_kb = InlineKeyboardMarkup(inline_keyboard=[
 ])
 
 # --- Клавиатура для выбора услуги ---
+# Клавиатура зависит только от настроек услуг и префикса, поэтому строится один раз
+# на каждую версию настроек: {(версия, prefix): markup}
+_services_kb_cache = {}
+
 def get_services_kb(services, prefix="service"):
+    config_version = tuple((service_id, info['name'], info['price']) for service_id, info in services.items())
+    cache_key = (config_version, prefix)
+    markup = _services_kb_cache.get(cache_key)
+    if markup is None:
+        markup = _build_services_kb(services, prefix)
+        _services_kb_cache[cache_key] = markup
+    return markup
+
+def _build_services_kb(services, prefix):
     builder = InlineKeyboardBuilder()
     for service_id, service_info in services.items():
         builder.button(
@@ -53,34 +67,64 @@ def get_services_kb(services, prefix="service"):
     return builder.as_markup()
 
 # --- Календарь для выбора даты ---
-def create_calendar_kb(year=None, month=None, prefix="date"):
-    if year is None: year = datetime.now().year
-    if month is None: month = datetime.now().month
-
-    builder = InlineKeyboardBuilder()
-    
+def create_calendar_kb(year=None, month=None, prefix="date", today=None):
+    if today is None: today = datetime.now().date()
+    if year is None: year = today.year
+    if month is None: month = today.month
+
+    # От текущей даты зависит только то, сколько первых дней месяца уже прошли.
+    # Это число входит в ключ кэша, поэтому после полуночи календарь перестраивается сам.
+    if (year, month) < (today.year, today.month):
+        past_days = 31
+    elif (year, month) > (today.year, today.month):
+        past_days = 0
+    else:
+        past_days = today.day - 1
+    return _render_calendar(year, month, prefix, past_days)
+
+@lru_cache(maxsize=256)
+def _render_calendar(year, month, prefix, past_days):
+    """Собирает календарь из заготовки месяца, подставляя кнопки прошедших дней."""
+    header_rows, weeks, nav_row = _calendar_skeleton(year, month, prefix)
+    rows = list(header_rows)
+    for week in weeks:
+        rows.append([
+            cell if isinstance(cell, InlineKeyboardButton) else (cell[2] if cell[0] <= past_days else cell[1])
+            for cell in week
+        ])
+    rows.append(nav_row)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+@lru_cache(maxsize=64)
+def _calendar_skeleton(year, month, prefix):
+    """Не зависящая от текущей даты часть календаря месяца.
+
+    Для каждого дня хранится (день, кнопка выбора даты, кнопка прошедшей даты).
+    """
     month_name = RUSSIAN_MONTHS[month - 1]
-    builder.row(
-        InlineKeyboardButton(text=" ", callback_data="ignore"),
-        InlineKeyboardButton(text=f"{month_name} {year}", callback_data="ignore"),
-        InlineKeyboardButton(text=" ", callback_data="ignore")
+    header_rows = (
+        [
+            InlineKeyboardButton(text=" ", callback_data="ignore"),
+            InlineKeyboardButton(text=f"{month_name} {year}", callback_data="ignore"),
+            InlineKeyboardButton(text=" ", callback_data="ignore")
+        ],
+        [InlineKeyboardButton(text=day, callback_data="ignore") for day in ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]],
     )
-    days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-    builder.row(*[InlineKeyboardButton(text=day, callback_data="ignore") for day in days])
 
-    month_calendar = calendar.monthcalendar(year, month)
-    for week in month_calendar:
-        row_buttons = []
+    blank_button = InlineKeyboardButton(text=" ", callback_data="ignore")
+    weeks = []
+    for week in calendar.monthcalendar(year, month):
+        cells = []
         for day in week:
             if day == 0:
-                row_buttons.append(InlineKeyboardButton(text=" ", callback_data="ignore"))
+                cells.append(blank_button)
             else:
-                current_date = datetime(year, month, day).date()
-                if current_date < datetime.now().date():
-                    row_buttons.append(InlineKeyboardButton(text=str(day), callback_data="past_date"))
-                else:
-                    row_buttons.append(InlineKeyboardButton(text=str(day), callback_data=f"{prefix}:{current_date.strftime('%Y-%m-%d')}"))
-        builder.row(*row_buttons)
+                cells.append((
+                    day,
+                    InlineKeyboardButton(text=str(day), callback_data=f"{prefix}:{year:04d}-{month:02d}-{day:02d}"),
+                    InlineKeyboardButton(text=str(day), callback_data="past_date")
+                ))
+        weeks.append(cells)
 
     if prefix.startswith("admin"):
         back_callback = "admin_panel"
@@ -88,17 +132,19 @@ def create_calendar_kb(year=None, month=None, prefix="date"):
         back_callback = "back_to_services"
         
     nav_callback_prefix = prefix.replace('date', '')
-    builder.row(
+    nav_row = [
         InlineKeyboardButton(text="<", callback_data=f"{nav_callback_prefix}prev_month:{year}-{month}"),
         InlineKeyboardButton(text="◀️ Назад", callback_data=back_callback),
         InlineKeyboardButton(text=">", callback_data=f"{nav_callback_prefix}next_month:{year}-{month}")
-    )
-    return builder.as_markup()
+    ]
+    return header_rows, weeks, nav_row
 
-def get_time_slots_kb(available_slots, back_callback="back_to_calendar", prefix="time"):
+def get_time_slots_kb(available_slots, back_callback="back_to_calendar", prefix="time", waitlist_callback=None):
     builder = InlineKeyboardBuilder()
     if not available_slots:
         builder.button(text="Свободных слотов нет", callback_data="ignore")
+        if waitlist_callback:
+            builder.button(text="🔔 Сообщить, когда освободится", callback_data=waitlist_callback)
     else:
         for slot in available_slots:
             builder.button(text=slot.strftime('%H:%M'), callback_data=f"{prefix}:{slot.strftime('%H:%M')}")
@@ -106,13 +152,12 @@ def get_time_slots_kb(available_slots, back_callback="back_to_calendar", prefix=
     builder.adjust(4)
     return builder.as_markup()
     
-def get_confirmation_kb(prefix=""):
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"{prefix}confirm_booking")],
-            [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_process")]
-        ]
-    )
+def get_confirmation_kb(prefix="", can_edit_contact=False):
+    inline_keyboard = [[InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"{prefix}confirm_booking")]]
+    if can_edit_contact:
+        inline_keyboard.append([InlineKeyboardButton(text="✏️ Изменить имя и телефон", callback_data="edit_contact")])
+    inline_keyboard.append([InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_process")])
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
 def get_my_bookings_kb(bookings):
     builder = InlineKeyboardBuilder()
@@ -120,10 +165,8 @@ def get_my_bookings_kb(bookings):
         builder.button(text="У вас нет активных записей", callback_data="ignore")
     else:
         for booking in bookings:
-            booking_id, service_name, booking_datetime = booking
-            dt_obj = datetime.strptime(booking_datetime, '%Y-%m-%d %H:%M')
-            text = f"{service_name} - {dt_obj.strftime('%d.%m.%Y %H:%M')}"
-            builder.button(text=f"❌ Отменить: {text}", callback_data=f"cancel_booking:{booking_id}")
+            text = f"{booking.service_name} - {booking.start:%d.%m.%Y %H:%M}"
+            builder.button(text=f"❌ Отменить: {text}", callback_data=f"cancel_booking:{booking.id}")
     
     builder.button(text="◀️ Назад в меню", callback_data="to_main_menu")
     builder.adjust(1)
@@ -133,6 +176,8 @@ admin_main_kb = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text="📋 Записи на день", callback_data="admin_view_bookings")],
     [InlineKeyboardButton(text="🗓️ Управление слотами", callback_data="admin_manage_slots")],
     [InlineKeyboardButton(text="✍️ Записать клиента", callback_data="admin_manual_booking_start")],
+    [InlineKeyboardButton(text="🔎 Найти клиента", callback_data="admin_search_client")],
+    [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
     [InlineKeyboardButton(text="🚪 Выйти в главное меню", callback_data="to_main_menu")] 
 ])
 
@@ -0,0 +1,133 @@
+# lifecycle.py
+
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд после сигнала остановки ждать обработки текущих апдейтов и очередей.
+# Должно быть меньше, чем ждет менеджер процессов перед SIGKILL (обычно 30 с).
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 25))
+# Перезапуск без простоя по SIGHUP (новый процесс наследует слушающий сокет). Выключен по умолчанию:
+# новый процесс переживает старый, а systemd (KillMode=control-group) и контейнерные платформы
+# при выходе главного процесса останавливают всю группу вместе с ним. Включать (RESTART_ON_SIGHUP=1)
+# только там, где бот запущен без такого надзора, например из nohup или screen на своей машине.
+RESTART_ON_SIGHUP = os.getenv("RESTART_ON_SIGHUP") == "1"
+# Сколько ждать готовности нового процесса при перезапуске без простоя
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", 60))
+
+# Переменные окружения, через которые новый процесс получает слушающий сокет и канал готовности.
+# Читаются один раз при импорте, чтобы их не унаследовали процессы-воркеры.
+LISTEN_FD_ENV = "AETERNA_LISTEN_FD"
+READY_FD_ENV = "AETERNA_READY_FD"
+_listen_fd = os.environ.pop(LISTEN_FD_ENV, None)
+_ready_fd = os.environ.pop(READY_FD_ENV, None)
+
+_shutdown_deadline = None
+
+
+def begin_shutdown():
+    """Отмечает начало остановки: от этого момента отсчитывается SHUTDOWN_TIMEOUT."""
+    global _shutdown_deadline
+    if _shutdown_deadline is None:
+        _shutdown_deadline = asyncio.get_running_loop().time() + SHUTDOWN_TIMEOUT
+
+def time_left():
+    """Сколько секунд осталось до конца остановки."""
+    if _shutdown_deadline is None:
+        return SHUTDOWN_TIMEOUT
+    return max(0.0, _shutdown_deadline - asyncio.get_running_loop().time())
+
+async def drain(awaitable, what):
+    """Ждет завершения awaitable, но не дольше остатка времени на остановку. Возвращает True, если успело."""
+    try:
+        await asyncio.wait_for(awaitable, time_left())
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"{what}: не завершено за {SHUTDOWN_TIMEOUT} с, прерываем")
+        return False
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler, который при остановке дожидается апдейтов, обрабатываемых в фоне.
+
+    Сессию бота не закрывает: она еще нужна фоновым задачам, ее закрывает on_shutdown в main.py.
+    """
+
+    closing = False
+
+    async def handle(self, request):
+        if self.closing:
+            # Telegram повторит доставку (при перезапуске - уже новому процессу)
+            return web.Response(status=503, text="Shutting down")
+        return await super().handle(request)
+
+    async def close(self):
+        self.closing = True
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logger.info(f"Ожидание обработки апдейтов: {len(tasks)}")
+            await drain(asyncio.gather(*tasks, return_exceptions=True), "Обработка апдейтов")
+
+
+def listen_socket(host, port):
+    """Слушающий сокет: унаследованный от старого процесса при перезапуске, иначе новый."""
+    global _listen_fd
+    if _listen_fd is not None:
+        sock = socket.socket(fileno=int(_listen_fd))
+        _listen_fd = None
+        logger.info(f"Используется сокет, переданный предыдущим процессом: {sock.getsockname()}")
+        return sock
+    return socket.create_server((host, port))
+
+def notify_ready():
+    """Сообщает старому процессу, что новый принимает запросы и тот может останавливаться."""
+    global _ready_fd
+    if _ready_fd is not None:
+        fd, _ready_fd = int(_ready_fd), None
+        try:
+            os.write(fd, b'1')
+        except OSError as e:
+            # Старый процесс перестал ждать (остановлен раньше) - работаем дальше сами
+            logger.warning(f"Не удалось сообщить о готовности предыдущему процессу: {e}")
+        finally:
+            os.close(fd)
+
+async def spawn_successor(sock, env=None):
+    """Запускает новый экземпляр программы с тем же слушающим сокетом и ждет его готовности.
+
+    Пока оба процесса живы, соединения на сокете принимают оба, поэтому запросы не теряются.
+    Возвращает True, если новый процесс готов и текущему пора останавливаться.
+    """
+    read_fd, write_fd = os.pipe()
+    child_env = {**os.environ, **(env or {}), LISTEN_FD_ENV: str(sock.fileno()), READY_FD_ENV: str(write_fd)}
+    process = subprocess.Popen([sys.executable, *sys.argv], env=child_env, pass_fds=(sock.fileno(), write_fd))
+    os.close(write_fd)
+    logger.info(f"Запущен новый процесс (pid {process.pid}), ожидание готовности")
+
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    # Пустое чтение - новый процесс завершился, не сообщив о готовности
+    loop.add_reader(read_fd, lambda: ready.done() or ready.set_result(os.read(read_fd, 1)))
+    try:
+        signal_byte = await asyncio.wait_for(ready, READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        signal_byte = b''
+    finally:
+        loop.remove_reader(read_fd)
+        os.close(read_fd)
+
+    if signal_byte != b'1':
+        logger.error(f"Новый процесс (pid {process.pid}) не запустился, продолжаем работу")
+        process.kill()
+        await asyncio.to_thread(process.wait)
+        return False
+    logger.info(f"Новый процесс (pid {process.pid}) готов, текущий останавливается")
+    return True
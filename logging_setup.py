@@ -0,0 +1,116 @@
+# logging_setup.py
+
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Контекст текущего апдейта (update_id, user_id, handler), заполняется middlewares.py.
+# Хранится словарь, чтобы внутренний middleware мог дописать имя хендлера.
+log_context = ContextVar('log_context', default=None)
+
+# Поля записи, которые попадают в JSON, если заданы (через extra=... или контекст)
+CONTEXT_FIELDS = ('update_id', 'user_id', 'handler', 'latency_ms', 'event', 'remote', 'sample_rate')
+
+# Частота выборки для событий с extra={'sample_key': ...}: пишется одна запись из N
+SAMPLE_RATES = {
+    'ping': int(os.getenv("LOG_SAMPLE_PING", 100)),
+    'callback': int(os.getenv("LOG_SAMPLE_CALLBACK", 10)),
+}
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет к записи поля из log_context. Работает в потоке, где вызван логгер."""
+
+    def filter(self, record):
+        context = log_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает одну из N записей с одинаковым sample_key. Предупреждения и ошибки не режутся."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.counters = {key: itertools.count() for key in rates}
+
+    def filter(self, record):
+        sample_key = getattr(record, 'sample_key', None)
+        if sample_key not in self.rates or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates[sample_key]
+        if rate <= 1:
+            return True
+        record.sample_rate = rate
+        return next(self.counters[sample_key]) % rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler для очереди внутри процесса: traceback сохраняется отдельно от текста."""
+
+    def prepare(self, record):
+        # Аргументы сообщения подставляются сразу - к моменту вывода в другом потоке они могут измениться
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Настраивает неблокирующее логгирование: запись в очередь, вывод - в отдельном потоке.
+
+    Возвращает запущенный QueueListener; его нужно остановить при завершении, чтобы дописать очередь.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(SAMPLE_RATES))
+    queue_handler.addFilter(ContextFilter())
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # "Update id=N is handled" на каждый апдейт заменяет запись логгера access (middlewares.py)
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    listener.start()
+    return listener
@@ -3,26 +3,31 @@
 import asyncio
 import logging
 import os
+import signal
 
 from aiohttp import web
 
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from aiogram.types import BotCommand, BotCommandScopeDefault, BotCommandScopeChat
 
 # --- Импортируем готовые переменные из config.py ---
-from config import BOT_TOKEN, ADMIN_IDS 
+from config import BOT_TOKEN, ADMIN_IDS, RESOURCES, SERVICES
 from handlers import router
-from database import init_db
+import lifecycle
+from database import checkpoint, init_db
+from notifications import waitlist_queue, waitlist_worker
+from logging_setup import setup_logging
+from middlewares import ChatLockMiddleware, HandlerNameMiddleware, UpdateLoggingMiddleware
+from recorder import UpdateRecorder
+from storage import SQLiteStorage
+from workers import ForwardingWebhookHandler, WorkerPool
 
 # --- Настройки логгирования ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
+# JSON-записи уходят в очередь, в stdout их пишет отдельный поток (не блокирует event loop)
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # --- Основные переменные из .env ---
@@ -30,6 +35,16 @@ WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
 WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", 10000))
 BASE_WEBHOOK_URL = os.getenv("BASE_WEBHOOK_URL")
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Число процессов-воркеров. При WORKERS > 1 основной процесс только принимает вебхук
+# и передает апдейты воркерам на порты WORKER_BASE_PORT, WORKER_BASE_PORT + 1, ...
+WORKERS = int(os.getenv("WORKERS", 1))
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", WEB_SERVER_PORT + 1))
+# При перезапуске без простоя воркеры старого и нового процесса какое-то время работают вместе,
+# поэтому новый процесс берет другой блок портов (0 или 1, передается через окружение)
+WORKER_PORT_BLOCK = int(os.getenv("WORKER_PORT_BLOCK", 0))
+# Запись входящих апдейтов для replay.py (без персональных данных). По умолчанию выключена.
+RECORD_UPDATES = os.getenv("RECORD_UPDATES")
+RECORD_SALT = os.getenv("RECORD_SALT", WEBHOOK_SECRET or "")
 
 # Путь для вебхука
 WEBHOOK_PATH = f"/webhook/{BOT_TOKEN}"
@@ -50,7 +65,8 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="/start", description="🚀 Начать заново / Главное меню")
     ]
     admin_commands = user_commands + [
-        BotCommand(command="/admin", description="⚙️ Админ-панель")
+        BotCommand(command="/admin", description="⚙️ Админ-панель"),
+        BotCommand(command="/find", description="🔎 Найти клиента")
     ]
 
     try:
@@ -64,10 +80,25 @@ async def set_bot_commands(bot: Bot):
 # --- Обработчик ping-запросов ---
 async def ping_server(request):
     """Отвечает на 'ping' запросы от сервисов мониторинга."""
-    logger.info(f"Получен ping-запрос от {request.remote} с URL: {request.url}")
+    logger.info("Получен ping-запрос", extra={'remote': request.remote, 'sample_key': 'ping'})
     return web.Response(text="ok")
 
 # --- Функции жизненного цикла ---
+# Фоновые задачи, запущенные при старте; отменяются при остановке
+background_tasks = []
+
+async def start_background_tasks(bot: Bot) -> None:
+    background_tasks.append(asyncio.create_task(waitlist_worker(bot)))
+
+async def stop_background_tasks(bot: Bot) -> None:
+    # Уведомления, уже поставленные в очередь, рассылаем до остановки
+    if waitlist_queue.qsize():
+        logger.info(f"Ожидание рассылки листа ожидания: {waitlist_queue.qsize()}")
+    await lifecycle.drain(waitlist_queue.join(), "Рассылка листа ожидания")
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+
 async def on_startup(bot: Bot) -> None:
     if not BASE_WEBHOOK_URL:
         logger.error("BASE_WEBHOOK_URL не задан в переменных окружения!")
@@ -83,37 +114,38 @@ async def on_startup(bot: Bot) -> None:
         raise
 
 async def on_shutdown(bot: Bot) -> None:
+    # Вебхук не удаляем: при перезапуске новый процесс продолжает принимать апдейты по тому же URL,
+    # а то, что не успели принять при остановке, Telegram доставит повторно
     try:
-        await bot.delete_webhook()
         await bot.session.close()
-        logger.info("Вебхук удален и сессия закрыта.")
+        checkpoint()
+        logger.info("Сессия закрыта, база сохранена.")
     except Exception as e:
-        logger.error(f"Ошибка при удалении вебхука: {e}")
+        logger.error(f"Ошибка при остановке: {e}")
 
-async def main():
-    # Инициализация базы данных
-    init_db()
-
-    # Настройка хранилища и диспетчера
-    storage = MemoryStorage()
+def create_dispatcher(storage) -> Dispatcher:
+    """Создает диспетчер с роутером и middlewares."""
     dp = Dispatcher(storage=storage)
     dp.include_router(router)
-    
-    # Регистрация хуков
-    dp.startup.register(on_startup)
-    dp.shutdown.register(on_shutdown)
-
-    # Инициализация бота
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    # Блокировка чата ставится перед FSMContextMiddleware: он читает состояние еще до вызова хендлера
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(UpdateLoggingMiddleware())
+    dp.update.outer_middleware(ChatLockMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    router.message.middleware(HandlerNameMiddleware())
+    router.callback_query.middleware(HandlerNameMiddleware())
+    return dp
 
-    # Создание aiohttp-приложения
+def create_bot_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """Создает aiohttp-приложение, которое передает апдейты вебхука в диспетчер."""
     app = web.Application()
     
     # Добавляем маршрут для пинга
     app.router.add_get("/ping", ping_server)
 
-    # Настройка вебхука
-    webhook_requests_handler = SimpleRequestHandler(
+    # Настройка вебхука. При остановке обработчик дожидается апдейтов, которые еще обрабатываются.
+    # Регистрируется до setup_application: сначала дорабатывают апдейты, потом останавливаются фоновые задачи.
+    webhook_requests_handler = lifecycle.DrainingRequestHandler(
         dispatcher=dp,
         bot=bot,
         secret_token=WEBHOOK_SECRET,
@@ -121,18 +153,145 @@ async def main():
     webhook_requests_handler.register(app, path=WEBHOOK_PATH)
     
     setup_application(app, dp, bot=bot)
+    return app
+
+def install_recorder(app: web.Application):
+    """Включает запись апдейтов вебхука, если задан RECORD_UPDATES."""
+    if RECORD_UPDATES:
+        recorder = UpdateRecorder(RECORD_UPDATES, RECORD_SALT, keep_ids=ADMIN_IDS)
+        recorder.install(app, WEBHOOK_PATH, WEBHOOK_SECRET)
+        logger.info(f"Запись апдейтов включена: {recorder.path}")
 
-    # Запуск сервера
+async def serve(app: web.Application, host, port, restart_env=None):
+    """Запускает aiohttp-приложение и обслуживает запросы до сигнала остановки.
+
+    SIGTERM/SIGINT - плавная остановка: сокет закрывается для новых соединений, текущие апдейты
+    и очереди дорабатываются (не дольше lifecycle.SHUTDOWN_TIMEOUT), затем закрываются сессия и база.
+    Если задан restart_env и включен lifecycle.RESTART_ON_SIGHUP, SIGHUP перезапускает процесс
+    без простоя: новый экземпляр получает тот же слушающий сокет (с переменными restart_env),
+    а текущий останавливается, когда тот готов. Под systemd и в контейнерах это не работает
+    (см. lifecycle.RESTART_ON_SIGHUP) - там перезапуск идет через SIGTERM и новый запуск.
+    """
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    # Access-лог aiohttp отключен: пинги логирует ping_server с выборкой, апдейты - UpdateLoggingMiddleware
+    runner = web.AppRunner(app, access_log=None, shutdown_timeout=lifecycle.SHUTDOWN_TIMEOUT)
     try:
-        runner = web.AppRunner(app)
         await runner.setup()
-        site = web.TCPSite(runner, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT)
-        await site.start()
-        logger.info(f"Сервер запущен на http://{WEB_SERVER_HOST}:{WEB_SERVER_PORT}")
-        await asyncio.Event().wait()
+        sock = lifecycle.listen_socket(host, port)
+        await web.SockSite(runner, sock).start()
+        logger.info(f"Сервер запущен на http://{host}:{port}")
     except Exception as e:
         logger.error(f"Ошибка при запуске сервера: {e}")
+        await runner.cleanup()
         raise
+    lifecycle.notify_ready()
+
+    restart_task = None
+
+    async def restart():
+        if await lifecycle.spawn_successor(sock, restart_env):
+            stop_event.set()
+
+    def on_sighup():
+        nonlocal restart_task
+        # Пока новый процесс запускается, повторный SIGHUP не должен запускать еще один
+        if stop_event.is_set() or (restart_task is not None and not restart_task.done()):
+            logger.warning("Перезапуск уже выполняется, SIGHUP пропущен")
+            return
+        restart_task = asyncio.create_task(restart())
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    if restart_env is not None and lifecycle.RESTART_ON_SIGHUP:
+        loop.add_signal_handler(signal.SIGHUP, on_sighup)
+
+    try:
+        await stop_event.wait()
+    finally:
+        lifecycle.begin_shutdown()
+        logger.info("Остановка: новые соединения не принимаются, дорабатываем текущие")
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
+        logger.info("Сервер остановлен")
+
+async def main():
+    # Инициализация базы данных
+    init_db(RESOURCES, SERVICES)
+
+    # Инициализация бота
+    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+
+    if WORKERS > 1:
+        await run_listener(bot)
+        return
+
+    # Настройка хранилища и диспетчера
+    storage = MemoryStorage()
+    dp = create_dispatcher(storage)
+    
+    # Регистрация хуков
+    dp.startup.register(on_startup)
+    dp.startup.register(start_background_tasks)
+    dp.shutdown.register(stop_background_tasks)
+    dp.shutdown.register(on_shutdown)
+
+    app = create_bot_app(dp, bot)
+    install_recorder(app)
+    await serve(app, WEB_SERVER_HOST, WEB_SERVER_PORT, restart_env={})
+
+# --- Режим нескольких воркеров ---
+async def run_listener(bot: Bot):
+    """Основной процесс: принимает вебхук на общем порту и распределяет апдейты по воркерам.
+
+    Апдейты одного чата всегда уходят в один воркер. FSM и кэши воркеры делят через SQLite.
+    """
+    pool = WorkerPool(run_worker, WORKERS, WORKER_BASE_PORT + WORKER_PORT_BLOCK * WORKERS)
+    pool.start()
+    await pool.wait_ready()
+
+    app = web.Application()
+    app.router.add_get("/ping", ping_server)
+    ForwardingWebhookHandler(pool.ports, WEBHOOK_PATH, WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    install_recorder(app)
+
+    async def on_app_startup(app):
+        await on_startup(bot)
+        app['watch_task'] = asyncio.create_task(pool.watch())
+
+    async def on_app_shutdown(app):
+        app['watch_task'].cancel()
+        await on_shutdown(bot)
+
+    app.on_startup.append(on_app_startup)
+    app.on_shutdown.append(on_app_shutdown)
+    try:
+        await serve(app, WEB_SERVER_HOST, WEB_SERVER_PORT, restart_env={"WORKER_PORT_BLOCK": str(1 - WORKER_PORT_BLOCK)})
+    finally:
+        # Воркеры получают SIGTERM и сами дорабатывают свои апдейты
+        await asyncio.to_thread(pool.stop, lifecycle.SHUTDOWN_TIMEOUT + 5)
+
+async def worker_main(index, port):
+    """Воркер: обрабатывает апдейты, присланные основным процессом на локальный порт."""
+    storage = SQLiteStorage()
+    dp = create_dispatcher(storage)
+    # Вебхук и меню команд настраивает основной процесс; воркер запускает только фоновые задачи
+    dp.startup.register(start_background_tasks)
+    dp.shutdown.register(stop_background_tasks)
+    dp.shutdown.register(on_shutdown)
+
+    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    await serve(create_bot_app(dp, bot), "127.0.0.1", port)
+
+def run_worker(index, port):
+    """Точка входа процесса-воркера (см. workers.WorkerPool)."""
+    try:
+        asyncio.run(worker_main(index, port))
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        log_listener.stop()
 
 if __name__ == "__main__":
     try:
@@ -141,4 +300,6 @@ if __name__ == "__main__":
         logger.info("Бот остановлен вручную.")
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        log_listener.stop()
\ No newline at end of file
@@ -0,0 +1,96 @@
+# middlewares.py
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from logging_setup import log_context
+
+access_logger = logging.getLogger("access")
+
+
+class UpdateLoggingMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.update: заполняет контекст логов и пишет одну запись на апдейт.
+
+    Записи о нажатиях inline-кнопок (навигация) пишутся с выборкой, см. logging_setup.SAMPLE_RATES.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        context = {'update_id': event.update_id, 'user_id': user.id if user else None}
+        token = log_context.set(context)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            access_logger.info(
+                "update handled",
+                extra={
+                    'event': event.event_type,
+                    'latency_ms': latency_ms,
+                    'sample_key': 'callback' if event.callback_query else None
+                }
+            )
+            log_context.reset(token)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware роутера: дописывает в контекст логов имя сработавшего хендлера."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        context = log_context.get()
+        handler_object = data.get("handler")
+        if context is not None and handler_object is not None:
+            context['handler'] = handler_object.callback.__name__
+        return await handler(event, data)
+
+
+class ChatLockMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.update: апдейты одного чата обрабатываются строго по очереди.
+
+    Обработчик вебхука запускает каждый апдейт в отдельной задаче, и без блокировки два быстрых
+    нажатия одного пользователя одновременно читают и пишут его состояние FSM.
+    """
+
+    def __init__(self):
+        # key -> [Lock, число апдейтов, ждущих или держащих блокировку]
+        self.locks = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat else user.id if user else None
+        if key is None:
+            return await handler(event, data)
+
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await handler(event, data)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
@@ -0,0 +1,51 @@
+# models.py
+
+from datetime import date, datetime, time
+from functools import lru_cache
+
+# Формат хранения дат в базе: 'YYYY-MM-DD HH:MM'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+# --- Быстрое кодирование/декодирование дат ---
+# strptime разбирает строку формата заново при каждом вызове; формат у нас фиксированный,
+# поэтому достаточно срезов строки. Время суток встречается не больше 1440 вариантов - кэшируем.
+
+@lru_cache(maxsize=1440)
+def parse_time(time_str):
+    """'HH:MM' -> time."""
+    return time(int(time_str[0:2]), int(time_str[3:5]))
+
+def parse_date(date_str):
+    """'YYYY-MM-DD' -> date."""
+    return date(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]))
+
+def parse_datetime(datetime_str):
+    """'YYYY-MM-DD HH:MM' -> datetime."""
+    return datetime(
+        int(datetime_str[0:4]), int(datetime_str[5:7]), int(datetime_str[8:10]),
+        int(datetime_str[11:13]), int(datetime_str[14:16])
+    )
+
+def format_datetime(dt_obj):
+    """datetime -> 'YYYY-MM-DD HH:MM' (формат хранения в базе)."""
+    return f"{dt_obj.year:04d}-{dt_obj.month:02d}-{dt_obj.day:02d} {dt_obj.hour:02d}:{dt_obj.minute:02d}"
+
+
+class BookingRow:
+    """Запись из базы с уже разобранным временем.
+
+    Запросы заполняют только нужные им поля, остальные остаются None.
+    """
+    __slots__ = ('id', 'start', 'service_name', 'status', 'client_name', 'client_phone', 'resource_name')
+
+    def __init__(self, start, service_name, id=None, status=None, client_name=None, client_phone=None, resource_name=None):
+        self.id = id
+        self.start = start
+        self.service_name = service_name
+        self.status = status
+        self.client_name = client_name
+        self.client_phone = client_phone
+        self.resource_name = resource_name
+
+    def __repr__(self):
+        return f"BookingRow(id={self.id!r}, start={self.start!r}, service_name={self.service_name!r})"
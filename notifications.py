@@ -0,0 +1,60 @@
+# notifications.py
+
+import asyncio
+import logging
+from datetime import date
+
+from aiogram import Bot
+
+import database as db
+from availability import get_available_slots
+from config import SERVICES
+from models import parse_date
+
+logger = logging.getLogger(__name__)
+
+# Очередь событий "освободилось время": (date_str, resource_id или None - для всех мастеров).
+# Хендлеры только кладут событие, рассылкой занимается фоновая задача waitlist_worker.
+waitlist_queue = asyncio.Queue()
+
+# Пауза между сообщениями, чтобы не упереться в лимиты Telegram на рассылку
+SEND_INTERVAL = 0.05
+
+def notify_slot_freed(date_str, resource_id=None):
+    """Ставит в очередь проверку листа ожидания на дату."""
+    waitlist_queue.put_nowait((date_str, resource_id))
+
+async def process_slot_freed(bot: Bot, date_str, resource_id):
+    """Уведомляет ожидающих на дату, если для их услуги действительно появилось свободное время."""
+    if parse_date(date_str) < date.today():
+        return
+    service_ids = db.get_waitlist_services(date_str)
+    if resource_id is not None:
+        resource_services = set(db.get_resource_services(resource_id))
+        service_ids = [service_id for service_id in service_ids if service_id in resource_services]
+
+    for service_id in service_ids:
+        if not get_available_slots(date_str, service_id):
+            continue
+        service_name = SERVICES[service_id]['name'] if service_id in SERVICES else service_id
+        for user_id in db.pop_waiters(date_str, service_id):
+            try:
+                await bot.send_message(
+                    user_id,
+                    f"🔔 Появилось свободное время на <b>{parse_date(date_str):%d.%m.%Y}</b> "
+                    f"для услуги «{service_name}».\nНажмите «📅 Записаться», чтобы выбрать время."
+                )
+            except Exception as e:
+                logger.error(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
+            await asyncio.sleep(SEND_INTERVAL)
+
+async def waitlist_worker(bot: Bot):
+    """Фоновая задача: разбирает очередь waitlist_queue."""
+    while True:
+        date_str, resource_id = await waitlist_queue.get()
+        try:
+            await process_slot_freed(bot, date_str, resource_id)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке листа ожидания на {date_str}: {e}")
+        finally:
+            waitlist_queue.task_done()
@@ -0,0 +1,185 @@
+# recorder.py
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from aiohttp import web
+
+import keyboards as kb
+from database import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+# Тексты, которые можно сохранять как есть: кнопки главного меню
+_KEEP_TEXTS = {button.text for row in kb.main_menu_kb.keyboard for button in row}
+_TIME_PATTERN = re.compile(r'^\d{1,2}:\d{2}$')
+_PHONE_PATTERN = re.compile(r'\+?\d[\d\s()-]{6,}')
+
+# Заглушка вместо имени. Телефоны заменяются псевдонимами того же формата (см. UpdateRecorder.pseudonymize_phone).
+PLACEHOLDER_NAME = "Клиент"
+
+# Записи сбрасываются на диск пачкой из FLUSH_EVERY строк или через FLUSH_INTERVAL секунд затишья
+FLUSH_EVERY = 50
+FLUSH_INTERVAL = 5
+
+
+class UpdateRecorder:
+    """Пишет входящие апдейты вебхука в журнал: одна строка JSON на апдейт, только дозапись.
+
+    Каждый процесс пишет в свой файл: к пути добавляется pid (updates.jsonl.gz -> updates.jsonl.<pid>.gz),
+    чтобы при перезапуске старый и новый процессы не перемешивали записи.
+    Пачка строк дописывается целиком; для .gz каждая пачка - отдельный gzip-блок, поэтому
+    при аварийной остановке теряется только недописанный хвост, а не весь файл.
+    Разбор, очистка и запись идут в отдельном потоке, обработчик запроса только кладет тело в очередь.
+    ID пользователей и чатов заменяются псевдонимами (стабильными при одинаковой соли),
+    ID из keep_ids (админы) сохраняются, чтобы при воспроизведении работала админ-панель.
+    """
+
+    def __init__(self, path, salt, keep_ids=()):
+        self.compress = path.endswith('.gz')
+        root, ext = (path[:-3], '.gz') if self.compress else (path, '')
+        self.path = f"{root}.{os.getpid()}{ext}"
+        self.salt = salt.encode()
+        self.keep_ids = set(keep_ids)
+        self.file = open(self.path, 'ab')
+        self.pending = []
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._write_loop, name="update-recorder", daemon=True)
+        self.thread.start()
+
+    def pseudonymize_id(self, value):
+        if value in self.keep_ids:
+            return value
+        digest = hashlib.blake2b(str(value).encode(), key=self.salt, digest_size=8).digest()
+        pseudo_id = 10**10 + int.from_bytes(digest, 'big') % 10**10
+        # Отрицательные ID у групп сохраняют знак
+        return -pseudo_id if value < 0 else pseudo_id
+
+    def pseudonymize_phone(self, phone):
+        """Телефон-псевдоним: разные номера остаются разными, чтобы клиенты не склеивались при воспроизведении."""
+        digest = hashlib.blake2b(normalize_phone(phone).encode(), key=self.salt, digest_size=8).digest()
+        return f"+79{int.from_bytes(digest, 'big') % 10**9:09d}"
+
+    def scrub_text(self, text):
+        """Заменяет введенный пользователем текст, если он может содержать персональные данные.
+
+        Команды сохраняются без аргументов, кнопки меню и время вида ЧЧ:ММ - как есть.
+        """
+        if text.startswith("/"):
+            command, _, args = text.partition(" ")
+            return f"{command} {PLACEHOLDER_NAME}" if args else command
+        if text in _KEEP_TEXTS or _TIME_PATTERN.match(text):
+            return text
+        if _PHONE_PATTERN.search(text):
+            return self.pseudonymize_phone(text)
+        return PLACEHOLDER_NAME
+
+    def _scrub_user(self, user):
+        scrubbed = {key: user[key] for key in ('is_bot', 'language_code', 'type') if key in user}
+        scrubbed['id'] = self.pseudonymize_id(user['id'])
+        if 'first_name' in user:
+            scrubbed['first_name'] = PLACEHOLDER_NAME
+        return scrubbed
+
+    def _scrub_message(self, message, keep_text):
+        scrubbed = {key: message[key] for key in ('message_id', 'date', 'message_thread_id') if key in message}
+        for key in ('from', 'chat'):
+            if key in message:
+                scrubbed[key] = self._scrub_user(message[key])
+        if keep_text and 'text' in message:
+            scrubbed['text'] = self.scrub_text(message['text'])
+            if scrubbed['text'] == message['text'] and 'entities' in message:
+                scrubbed['entities'] = message['entities']
+            elif scrubbed['text'].startswith('/'):
+                command_length = len(scrubbed['text'].partition(' ')[0])
+                scrubbed['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': command_length}]
+        if 'contact' in message:
+            scrubbed['contact'] = {
+                'phone_number': self.pseudonymize_phone(message['contact'].get('phone_number', '')),
+                'first_name': PLACEHOLDER_NAME,
+            }
+        return scrubbed
+
+    def scrub_update(self, update):
+        """Копия апдейта без персональных данных (поддерживаются сообщения и нажатия кнопок)."""
+        scrubbed = {'update_id': update['update_id']}
+        for key in ('message', 'edited_message'):
+            if key in update:
+                scrubbed[key] = self._scrub_message(update[key], keep_text=True)
+        if 'callback_query' in update:
+            callback = update['callback_query']
+            scrubbed['callback_query'] = {
+                'id': callback['id'],
+                'chat_instance': callback.get('chat_instance', ''),
+                'from': self._scrub_user(callback['from']),
+                'data': callback.get('data'),
+            }
+            if 'message' in callback:
+                # Текст сообщения бота может содержать имена и телефоны клиентов - не сохраняем
+                scrubbed['callback_query']['message'] = self._scrub_message(callback['message'], keep_text=False)
+        return scrubbed
+
+    def record(self, body):
+        """Ставит тело запроса в очередь на запись; время фиксируется в момент приема."""
+        self.queue.put((time.time(), body))
+
+    def _add(self, ts, body):
+        update = json.loads(body)
+        line = json.dumps({'ts': round(ts, 3), 'update': self.scrub_update(update)},
+                          ensure_ascii=False, separators=(',', ':'))
+        self.pending.append(line.encode() + b'\n')
+
+    def _flush(self):
+        if not self.pending:
+            return
+        chunk = b''.join(self.pending)
+        self.pending = []
+        self.file.write(gzip.compress(chunk) if self.compress else chunk)
+        self.file.flush()
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                item = ()
+            try:
+                if item:
+                    self._add(*item)
+                if item is None or not item or len(self.pending) >= FLUSH_EVERY:
+                    self._flush()
+            except Exception as e:
+                logger.error(f"Не удалось записать апдейт: {e}")
+            if item is None:
+                break
+
+    def close(self):
+        """Дописывает очередь и закрывает журнал."""
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def install(self, app, path, secret_token):
+        """Подключает запись к aiohttp-приложению для POST-запросов на path с верным секретом."""
+
+        @web.middleware
+        async def recording_middleware(request, handler):
+            if (request.method == "POST" and request.path == path
+                    and request.headers.get("X-Telegram-Bot-Api-Secret-Token") == secret_token):
+                # aiohttp кэширует тело запроса, обработчик вебхука прочитает его повторно
+                self.record(await request.read())
+            return await handler(request)
+
+        async def close_recorder(app):
+            await asyncio.to_thread(self.close)
+
+        app.middlewares.append(recording_middleware)
+        app.on_cleanup.append(close_recorder)
@@ -0,0 +1,231 @@
+# replay.py
+"""Воспроизведение записанных апдейтов (см. recorder.py) для сравнения версий кода.
+
+Апдейты подаются в диспетчер напрямую, запросы к Telegram перехватывает фейковая сессия,
+база - копия указанного bookings.db во временном каталоге (оригинал не меняется).
+
+    python replay.py updates.jsonl.*.gz --db bookings.db --speed max --report new.json --baseline old.json
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+# main.py проверяет переменные вебхука при импорте; при воспроизведении они не используются
+os.environ.setdefault("BASE_WEBHOOK_URL", "http://replay.invalid")
+os.environ.setdefault("WEBHOOK_SECRET", "replay")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from logging_setup import ContextFilter
+
+PERCENTILES = (50, 95, 99)
+
+
+def read_records(paths):
+    """Читает журналы записи (по одному на процесс) и объединяет их: список (ts, update) по времени.
+
+    Недописанный хвост журнала (процесс остановлен аварийно) пропускается с предупреждением.
+    """
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records.append((record['ts'], record['update']))
+        except (EOFError, gzip.BadGzipFile, ValueError) as e:
+            print(f"{path}: журнал оборван ({e}), прочитано до обрыва", file=sys.stderr)
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: на каждый метод Bot API возвращает правдоподобный ответ и считает вызовы."""
+
+    def __init__(self, api_latency=0.0):
+        super().__init__()
+        self.api_latency = api_latency
+        self.calls = Counter()
+        self.message_id = 0
+
+    async def close(self):
+        pass
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        returning = str(method.__returning__)
+        if 'Message' in returning and 'MessageId' not in returning:
+            self.message_id += 1
+            result = {
+                'message_id': self.message_id,
+                'date': int(time.time()),
+                'chat': {'id': getattr(method, 'chat_id', None) or 0, 'type': 'private'},
+                'text': getattr(method, 'text', None) or '',
+            }
+        else:
+            result = True
+        response = self.check_response(bot, method, 200, json.dumps({'ok': True, 'result': result}))
+        return response.result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+
+class LatencyCollector(logging.Handler):
+    """Собирает из access-лога задержку обработки каждого апдейта и имя хендлера."""
+
+    def __init__(self):
+        super().__init__()
+        self.addFilter(ContextFilter())
+        self.samples = []
+
+    def emit(self, record):
+        handler = getattr(record, 'handler', None) or f"<{record.event}: без хендлера>"
+        self.samples.append((handler, record.latency_ms))
+
+
+def summarize(samples):
+    """Статистика задержек по хендлерам: count, mean и перцентили в мс."""
+    by_handler = defaultdict(list)
+    for handler, latency_ms in samples:
+        by_handler[handler].append(latency_ms)
+        by_handler['*'].append(latency_ms)
+    summary = {}
+    for handler, values in sorted(by_handler.items()):
+        values.sort()
+        stats = {'count': len(values), 'mean_ms': round(sum(values) / len(values), 3)}
+        for p in PERCENTILES:
+            stats[f'p{p}_ms'] = values[min(len(values) - 1, len(values) * p // 100)]
+        stats['max_ms'] = values[-1]
+        summary[handler] = stats
+    return summary
+
+
+async def replay(records, speed, api_latency):
+    """Подает апдейты в диспетчер. speed='original' - с исходными интервалами, 'max' - подряд."""
+    from config import BOT_TOKEN
+    from main import create_dispatcher
+
+    session = FakeSession(api_latency)
+    bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    dp = create_dispatcher(MemoryStorage())
+
+    # Апдейты одного чата выстраивает в очередь ChatLockMiddleware диспетчера, разных чатов - идут параллельно
+    async def feed(update):
+        try:
+            await dp.feed_update(bot, Update.model_validate(update, context={'bot': bot}))
+        except Exception as e:
+            print(f"Апдейт {update.get('update_id')}: ошибка {e!r}", file=sys.stderr)
+
+    started = time.perf_counter()
+    if speed == 'max':
+        for _, update in records:
+            await feed(update)
+    else:
+        loop = asyncio.get_running_loop()
+        start_loop, start_ts = loop.time(), records[0][0] if records else 0
+        tasks = []
+        for ts, update in records:
+            delay = start_loop + (ts - start_ts) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(feed(update)))
+        await asyncio.gather(*tasks)
+    return time.perf_counter() - started, session.calls
+
+
+def print_report(report, baseline=None):
+    print(f"Апдейтов: {report['updates']}, время: {report['total_s']} с, вызовов API: {sum(report['api_calls'].values())}")
+    header = f"{'хендлер':<32}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}"
+    if baseline:
+        header += f"{'base p50':>10}{'base p95':>10}{'Δ p50':>9}"
+    print(header)
+    base_handlers = baseline['handlers'] if baseline else {}
+    for handler, stats in report['handlers'].items():
+        line = f"{handler:<32}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        base = base_handlers.get(handler)
+        if base:
+            delta = (stats['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100 if base['p50_ms'] else 0
+            line += f"{base['p50_ms']:>10}{base['p95_ms']:>10}{delta:>+8.1f}%"
+        elif baseline:
+            line += f"{'-':>10}{'-':>10}{'новый':>9}"
+        print(line)
+    for handler in base_handlers.keys() - report['handlers'].keys():
+        print(f"{handler:<32} нет в текущем прогоне")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных апдейтов")
+    parser.add_argument('logs', nargs='+', help="журналы записи (RECORD_UPDATES, по одному на процесс)")
+    parser.add_argument('--db', default='bookings.db', help="база, копия которой используется при воспроизведении")
+    parser.add_argument('--speed', choices=('original', 'max'), default='max')
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа фейкового Bot API, мс")
+    parser.add_argument('--report', help="сохранить отчет в JSON")
+    parser.add_argument('--baseline', help="отчет прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    records = read_records([os.path.abspath(path) for path in args.logs])
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    report_path = os.path.abspath(args.report) if args.report else None
+
+    # Модули работают с 'bookings.db' в текущем каталоге - подменяем его копией
+    workdir = tempfile.mkdtemp(prefix='replay-')
+    # В режиме WAL часть изменений может быть еще в файле -wal
+    for suffix in ('', '-wal'):
+        if os.path.exists(args.db + suffix):
+            shutil.copy(args.db + suffix, os.path.join(workdir, 'bookings.db' + suffix))
+    os.chdir(workdir)
+
+    from config import RESOURCES, SERVICES
+    from database import init_db
+    init_db(RESOURCES, SERVICES)
+
+    collector = LatencyCollector()
+    access_logger = logging.getLogger("access")
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    access_logger.addHandler(collector)
+
+    from main import log_listener
+    try:
+        total_s, calls = asyncio.run(replay(records, args.speed, args.api_latency / 1000))
+    finally:
+        log_listener.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'updates': len(records),
+        'speed': args.speed,
+        'total_s': round(total_s, 3),
+        'api_calls': dict(calls),
+        'handlers': summarize(collector.samples),
+    }
+    print_report(report, baseline)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# storage.py
+
+import json
+import sqlite3
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite, общее для всех процессов-воркеров.
+
+    Апдейты одного чата всегда попадают в один воркер (см. workers.route_key),
+    поэтому чтение-изменение-запись данных одного ключа не конкурирует между процессами,
+    а внутри воркера их по очереди пропускает middlewares.ChatLockMiddleware.
+    """
+
+    def __init__(self, path='bookings.db'):
+        self.path = path
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}'
+        ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+
+    async def close(self) -> None:
+        pass
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        conn = sqlite3.connect(self.path)
+        conn.execute('''
+        INSERT INTO fsm_storage (key, state) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET state = excluded.state
+        ''', (self.key_builder.build(key), state))
+        conn.commit()
+        conn.close()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        conn = sqlite3.connect(self.path)
+        row = conn.execute("SELECT state FROM fsm_storage WHERE key = ?", (self.key_builder.build(key),)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        conn = sqlite3.connect(self.path)
+        conn.execute('''
+        INSERT INTO fsm_storage (key, data) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET data = excluded.data
+        ''', (self.key_builder.build(key), json.dumps(dict(data), ensure_ascii=False)))
+        conn.commit()
+        conn.close()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        conn = sqlite3.connect(self.path)
+        row = conn.execute("SELECT data FROM fsm_storage WHERE key = ?", (self.key_builder.build(key),)).fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else {}
@@ -0,0 +1,141 @@
+# workers.py
+
+import asyncio
+import logging
+import multiprocessing
+import time
+import zlib
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+logger = logging.getLogger(__name__)
+
+# Типы апдейтов, в которых есть чат или пользователь для маршрутизации
+_ROUTED_EVENTS = (
+    'message', 'edited_message', 'callback_query', 'my_chat_member', 'chat_member',
+    'inline_query', 'chosen_inline_result', 'pre_checkout_query', 'shipping_query'
+)
+
+def route_key(update):
+    """Ключ маршрутизации апдейта: id чата (или пользователя), чтобы апдейты одного чата шли в один воркер."""
+    for event_type in _ROUTED_EVENTS:
+        event = update.get(event_type)
+        if not event:
+            continue
+        chat = event.get('chat') or (event.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        if event.get('from'):
+            return event['from']['id']
+    return update.get('update_id', 0)
+
+def worker_index(key, workers_count):
+    """Номер воркера для ключа; crc32 стабилен между процессами в отличие от hash()."""
+    return zlib.crc32(str(key).encode()) % workers_count
+
+
+class WorkerPool:
+    """Дочерние процессы-воркеры, каждый слушает свой локальный порт.
+
+    target(index, port) запускается в отдельном процессе (spawn); упавший воркер перезапускается.
+    """
+
+    def __init__(self, target, workers_count, base_port):
+        self.target = target
+        self.ports = [base_port + index for index in range(workers_count)]
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = [None] * workers_count
+
+    def _spawn(self, index):
+        process = self.context.Process(target=self.target, args=(index, self.ports[index]), name=f"worker-{index}")
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Воркер {index} запущен (pid {process.pid}, порт {self.ports[index]})")
+
+    def start(self):
+        for index in range(len(self.ports)):
+            self._spawn(index)
+
+    async def wait_ready(self, timeout=60):
+        """Ждет, пока все воркеры начнут принимать соединения."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for port in self.ports:
+            while True:
+                try:
+                    _, writer = await asyncio.open_connection("127.0.0.1", port)
+                    writer.close()
+                    await writer.wait_closed()
+                    break
+                except OSError:
+                    if loop.time() > deadline:
+                        raise RuntimeError(f"Воркер на порту {port} не запустился за {timeout} с")
+                    await asyncio.sleep(0.2)
+
+    async def watch(self, interval=5):
+        """Следит за воркерами и перезапускает завершившиеся."""
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                    self._spawn(index)
+
+    def stop(self, timeout=10):
+        """Останавливает воркеры: SIGTERM (воркер дорабатывает текущие апдейты), по истечении timeout - SIGKILL."""
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is not None:
+                process.join(max(0, deadline - time.monotonic()))
+                if process.is_alive():
+                    logger.error(f"Воркер {process.name} не завершился за {timeout} с, принудительная остановка")
+                    process.kill()
+                    process.join()
+
+
+class ForwardingWebhookHandler:
+    """Принимает вебхук на общем порту и передает апдейт воркеру, выбранному по чату."""
+
+    def __init__(self, ports, path, secret_token):
+        self.urls = [f"http://127.0.0.1:{port}{path}" for port in ports]
+        self.secret_token = secret_token
+        self.session = None
+
+    def register(self, app, path):
+        app.router.add_post(path, self.handle)
+        app.on_startup.append(self._open_session)
+        app.on_cleanup.append(self._close_session)
+
+    async def _open_session(self, app):
+        self.session = ClientSession(timeout=ClientTimeout(total=60))
+
+    async def _close_session(self, app):
+        await self.session.close()
+
+    async def handle(self, request):
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret_token:
+            return web.Response(status=401, text="Unauthorized")
+        body = await request.read()
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+
+        url = self.urls[worker_index(route_key(update), len(self.urls))]
+        try:
+            async with self.session.post(
+                url, data=body,
+                headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": self.secret_token}
+            ) as response:
+                # Content-Type передается целиком: у multipart-ответа в нем boundary
+                return web.Response(
+                    status=response.status, body=await response.read(),
+                    headers={"Content-Type": response.headers.get("Content-Type", "application/json")}
+                )
+        except ClientError as e:
+            # Telegram повторит доставку, когда воркер снова поднимется
+            logger.error(f"Воркер {url} недоступен: {e}")
+            return web.Response(status=502, text="Worker unavailable")